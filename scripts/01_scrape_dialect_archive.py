@@ -1,12 +1,19 @@
 import requests
 from bs4 import BeautifulSoup as bf
+import soupsieve
 
 import os
 import time
 import json
-
+import orjson
+import argparse
+import threading
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin
-from pydub import AudioSegment
 
 """
 
@@ -22,27 +29,120 @@ headers = {
 "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/117.0"
 }
 
-def extract_audio_url(soup):
-    audio_tag = soup.find('audio')
-    if audio_tag and audio_tag.get('src'):
-        return audio_tag['src']
+# Concurrency settings for the crawl
+MAX_WORKERS = 16
+REQUESTS_PER_SECOND = 4
+
+# Audio download buffering
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class RateLimiter:
+    '''
+    Token bucket shared by all worker threads so the crawl stays polite to the
+    archive no matter how many fetches are in flight.
+    '''
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+
+
+def make_session():
+    '''
+    One keep-alive session for the whole crawl so repeat requests to the archive
+    reuse open connections. Transient failures are retried with backoff.
+    '''
+    session = requests.Session()
+    session.headers.update(headers)
+
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+SESSION = make_session()
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND)
 
-    if audio_tag:
-        source_tag = audio_tag.find('source')
-        if source_tag and source_tag.get('src'):
-            return source_tag['src']
 
+def fetch(url, **kwargs):
+    RATE_LIMITER.wait()
+    return SESSION.get(url, **kwargs)
+
+
+# CSS selectors compiled once and reused for every page
+AUDIO_TAG = soupsieve.compile('audio')
+AUDIO_CHILD_SELECTORS = [
+    (soupsieve.compile('source[src]'), 'src'),
+    (soupsieve.compile('a[href]'), 'href'),
+]
+MP3_LINK = soupsieve.compile('a[href$=".mp3"]')
+ARTICLE_LINKS = soupsieve.compile('a[href]')
+
+
+def cached_layer(cache_path, build, force=False):
+    '''
+    Return (layer, complete) for the crawl layer saved at cache_path, building it if needed.
+    build returns (layer, complete); only complete layers are saved, so a layer with any
+    failed page is used for this run and crawled again on the next one.
+    '''
+    if cache_path and not force and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f), True
+
+    layer, complete = build()
+
+    if cache_path and complete:
+        with open(cache_path, 'w') as f:
+            json.dump(layer, f, indent=2)
+
+    return layer, complete
+
+
+def layer_path(cache_dir, name):
+    return os.path.join(cache_dir, f'crawl_{name}.json') if cache_dir else None
+
+
+def is_nonempty(path):
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def extract_audio_url(soup):
+    # Only the first <audio> subtree is searched for sources, so the page is walked once
+    audio_tag = AUDIO_TAG.select_one(soup)
     if audio_tag:
-        a_tag = audio_tag.find('a')
-        if a_tag and a_tag.get('href'):
-            return a_tag['href']
-        
-    all_links = soup.find_all('a', href=True)
-    for link in all_links:
-        if link['href'].endswith('.mp3'):
-            return link['href']
-    
-    return None
+        if audio_tag.get('src'):
+            return audio_tag['src']
+
+        for selector, attr in AUDIO_CHILD_SELECTORS:
+            tag = selector.select_one(audio_tag)
+            if tag:
+                return tag[attr]
+
+    mp3_link = MP3_LINK.select_one(soup)
+    return mp3_link['href'] if mp3_link else None
 
 
 def get_continent_urls():
@@ -52,13 +152,13 @@ def get_continent_urls():
     '''
 
     url = "https://www.dialectsarchive.com/dialects-accents"
-    response = requests.get(url, headers=headers)
+    response = fetch(url)
 
     if response.status_code != 200:
         print(f'Failed to load page. Status code: {response.status_code}')
         return {}
 
-    soup = bf(response.text, 'html.parser')
+    soup = bf(response.text, 'lxml')
 
     # Dictionary to hold the links and names
     continent_urls = {}
@@ -70,7 +170,7 @@ def get_continent_urls():
         return {}
     
     # Extract each <a> link and store its title and URL
-    for link in article_div.find_all('a'):
+    for link in ARTICLE_LINKS.select(article_div):
         name = link.text.strip()
         href = link.get('href')
         continent_urls[name] = href
@@ -78,169 +178,245 @@ def get_continent_urls():
     return continent_urls
 
 
-def get_country_urls():
+def fetch_countries(continent, url):
+    '''
+    Returns the continent's country entries, or None if its page failed to load.
+    '''
+    response = fetch(url)
+
+    if response.status_code != 200:
+        print(f'Failed to load page. Status code: {response.status_code}')
+        return None
+
+    soup = bf(response.text, 'lxml')
+
+    # Locate the main container
+    article_div = soup.find('div', class_='article')
+    if not article_div:
+        print(f"Could not find the <div class='article'> section")
+        return None
+
+    # Extract each <a> link and store its title and URL
+    urls = []
+    for link in ARTICLE_LINKS.select(article_div):
+        country = link.text.strip()
+        href = link.get('href')
+        urls.append({
+            "continent": continent,
+            "country": country,
+            "url": href
+        })
+
+    return urls
+
+
+def get_country_urls(cache_dir=None, force=False):
     '''
     This function iterates through each continent and region, extracting each country. 
     Countries are the second layer in the HTML crawl.
     '''
 
-    urls = []
+    def build_continents():
+        continent_urls = get_continent_urls()
+        return continent_urls, bool(continent_urls)
+
+    continent_urls, complete = cached_layer(layer_path(cache_dir, 'continents'), build_continents, force)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results = list(ex.map(fetch_countries, continent_urls.keys(), continent_urls.values()))
 
-    continent_urls = get_continent_urls()
+    complete = complete and all(urls is not None for urls in results)
+    return [entry for urls in results if urls for entry in urls], complete
 
-    for continent, url in list(continent_urls.items()):
-        response = requests.get(url, headers=headers)
 
-        if response.status_code != 200:
-            print(f'Failed to load page. Status code: {response.status_code}')
-            return {}
+def fetch_speakers(entry):
+    '''
+    Returns the country's speaker entries, or None if its page failed to load.
+    '''
+    continent = entry["continent"]
+    country = entry["country"]
+    country_url = entry["url"]
 
-        soup = bf(response.text, 'html.parser')
+    response = fetch(country_url)
 
-        # Locate the main container
-        article_div = soup.find('div', class_='article')
-        if not article_div:
-            print(f"Could not find the <div class='article'> section")
-            continue
+    if response.status_code != 200:
+        print(f'Failed to load page. Status code: {response.status_code}')
+        return None
 
-        # Extract each <a> link and store its title and URL
-        for link in article_div.find_all('a'):
-            country = link.text.strip()
-            href = link.get('href')
-            urls.append({
-                "continent": continent,
-                "country": country,
-                "url": href
-            })
+    soup = bf(response.text, 'lxml')
 
-    return urls
+    article_div = soup.find('div', class_='article')
+    if not article_div:
+        print(f"Could not find the <div class='article'> section")
+        return None
 
-def get_speaker_urls():
     speakers = []
+    for link in ARTICLE_LINKS.select(article_div):
+        speaker = link.text.strip()
+        href = link.get('href')
+        speakers.append({
+            "continent": continent,
+            "country": country,
+            "speaker": speaker,
+            "url": href
+        })
 
-    country_urls = get_country_urls()
-
-    for entry in country_urls:
-        continent = entry["continent"]
-        country = entry["country"]
-        country_url = entry["url"]
-
-        response = requests.get(country_url, headers=headers)
-        soup = bf(response.text, 'html.parser')
-
-        article_div = soup.find('div', class_='article')
-        if not article_div:
-            print(f"Could not find the <div class='article'> section")
-            continue
-        
-        for link in article_div.find_all('a'):
-            speaker = link.text.strip()
-            href = link.get('href')
-            speakers.append({
-                "continent": continent,
-                "country": country,
-                "speaker": speaker,
-                "url": href
-            })
-        
     return speakers
 
 
-def get_audio(output_dir):
+def get_speaker_urls(cache_dir=None, force=False):
+    country_urls, complete = cached_layer(
+        layer_path(cache_dir, 'countries'),
+        lambda: get_country_urls(cache_dir, force),
+        force
+    )
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results = list(ex.map(fetch_speakers, country_urls))
+
+    complete = complete and all(speakers is not None for speakers in results)
+    return [speaker for speakers in results if speakers for speaker in speakers], complete
+
+
+def write_transcript(soup, text_path):
+    '''
+    Save the speaker page's first long (>50 word) paragraph as the transcript; empty if none.
+    '''
+    article = soup.find('div', class_='article')
+    transcript = ""
+    if article:
+        paragraphs = article.find_all('p')
+        for p in paragraphs:
+            text = p.get_text(strip=True)
+            if len(text.split()) > 50:
+                transcript = text
+                break  # first long paragraph is enough
+
+    with open(text_path, 'w') as t:
+        t.write(transcript)
+
+    return transcript
+
+
+def download_speaker(entry, output_dir, previous=None, force=False):
+    continent = entry['continent'].lower().replace(' ', '_')
+    country = entry['country'].lower().replace(' ', '_')
+    speaker = entry['speaker'].lower().replace(' ', '_')
+    speaker_url = entry['url']
+
+    base_filename = f"{continent}_{country}_{speaker}"
+    audio_path = os.path.join(output_dir, base_filename + ".mp3")
+    wav_path = os.path.join(output_dir, base_filename + ".wav")
+    text_path = os.path.join(output_dir, base_filename + ".txt")
+
+    # Audio already downloaded on an earlier run. The transcript file may be empty
+    # (no long paragraph on the page); only a missing one means the page is needed again.
+    have_audio = not force and is_nonempty(wav_path)
+    if have_audio and os.path.exists(text_path):
+        with open(text_path) as t:
+            transcript = t.read()
+
+        entry['audio_url'] = (previous or {}).get(wav_path, {}).get('audio_url', '')
+        entry['local_audio_path'] = wav_path
+        entry['transcript'] = transcript
+        return entry
+
+    try:
+        page_resp = fetch(speaker_url, timeout=15)
+        page_resp.raise_for_status()
+
+        soup = bf(page_resp.text, 'lxml')
+
+        if have_audio:
+            entry['audio_url'] = (previous or {}).get(wav_path, {}).get('audio_url', '')
+            entry['local_audio_path'] = wav_path
+            entry['transcript'] = write_transcript(soup, text_path)
+            return entry
+
+        audio_url = extract_audio_url(soup)
+
+        if not audio_url:
+            print(f"[WARN] No audio found for: {speaker}")
+            return None
+
+        # Make absolute URL
+        audio_url = urljoin(speaker_url, audio_url)
+
+        # Download audio with basic validation
+        audio_resp = fetch(audio_url, stream=True, timeout=30)
+        audio_resp.raise_for_status()
+
+        content_type = audio_resp.headers.get("Content-Type", "")
+        if "audio" not in content_type and "mpeg" not in content_type:
+            print(f"[WARN] Non-audio content for {speaker}: {content_type}")
+            return None
+
+        # Stream to disk
+        with open(audio_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            for chunk in audio_resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+
+        # Validate and normalize to WAV, 16k mono in a single ffmpeg pass
+        result = subprocess.run([
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-i", audio_path, "-ac", "1", "-ar", "16000", "-vn", wav_path,
+        ], capture_output=True, text=True)
+        os.remove(audio_path)
+
+        if result.returncode != 0:
+            print(f"[ERROR] Invalid audio for {speaker} ({audio_path}): {result.stderr.strip()}")
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+            return None
+
+        audio_path = wav_path
+
+        entry['audio_url'] = audio_url
+        entry['local_audio_path'] = audio_path
+        entry['transcript'] = write_transcript(soup, text_path)
+
+        return entry
+
+    except Exception as e:
+        print(f'[ERROR] Processing {speaker_url}: {e}')
+        return None
+
+
+def get_audio(output_dir, force=False):
     os.makedirs(output_dir, exist_ok=True)
-    updated_speakers = []
-
-    speaker_urls = get_speaker_urls()
-
-    for entry in speaker_urls:
-        continent = entry['continent'].lower().replace(' ', '_')
-        country = entry['country'].lower().replace(' ', '_')
-        speaker = entry['speaker'].lower().replace(' ', '_')
-        speaker_url = entry['url']
-
-        base_filename = f"{continent}_{country}_{speaker}"
-        audio_path = os.path.join(output_dir, base_filename + ".mp3")
-        text_path = os.path.join(output_dir, base_filename + ".txt")
-
-        try:
-            page_resp = requests.get(speaker_url, headers=headers, timeout=15)
-            page_resp.raise_for_status()
-
-            soup = bf(page_resp.text, 'html.parser')
-            audio_url = extract_audio_url(soup)
-
-            if not audio_url:
-                print(f"[WARN] No audio found for: {speaker}")
-                continue
-
-            # Make absolute URL
-            audio_url = urljoin(speaker_url, audio_url)
-
-            # Download audio with basic validation
-            audio_resp = requests.get(audio_url, headers=headers, stream=True, timeout=30)
-            audio_resp.raise_for_status()
-
-            content_type = audio_resp.headers.get("Content-Type", "")
-            if "audio" not in content_type and "mpeg" not in content_type:
-                print(f"[WARN] Non-audio content for {speaker}: {content_type}")
-                continue
-
-            # Stream to disk
-            with open(audio_path, 'wb') as f:
-                for chunk in audio_resp.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-
-            # Validate audio with pydub/ffmpeg
-            try:
-                audio = AudioSegment.from_file(audio_path)
-            except Exception as e:
-                print(f"[ERROR] Invalid audio for {speaker} ({audio_path}): {e}")
-                os.remove(audio_path)
-                continue
-
-            # Optional: normalize to WAV, 16k mono
-            audio = audio.set_channels(1)
-            audio = audio.set_frame_rate(16000)
-            wav_path = audio_path.replace(".mp3", ".wav")
-            audio.export(wav_path, format='wav')
-            os.remove(audio_path)
-            audio_path = wav_path
-
-            # Get transcript text 
-            article = soup.find('div', class_='article')
-            transcript = ""
-            if article:
-                paragraphs = article.find_all('p')
-                for p in paragraphs:
-                    text = p.get_text(strip=True)
-                    if len(text.split()) > 50:
-                        transcript = text
-                        break  # first long paragraph is enough
-
-            with open(text_path, 'w') as t:
-                t.write(transcript)
-
-            entry['audio_url'] = audio_url
-            entry['local_audio_path'] = audio_path
-            entry['transcript'] = transcript
-
-            updated_speakers.append(entry)
-            time.sleep(1)  
-
-        except Exception as e:
-            print(f'[ERROR] Processing {speaker_url}: {e}')
-            continue
-
-    with open(os.path.join(output_dir, 'dialects_metadata.json'), 'w') as f:
-        json.dump(updated_speakers, f, indent=2)
+    metadata_path = os.path.join(output_dir, 'dialects_metadata.json')
+
+    speaker_urls, _ = cached_layer(
+        layer_path(output_dir, 'speakers'),
+        lambda: get_speaker_urls(output_dir, force),
+        force
+    )
+
+    # Metadata from the last run, used to fill in speakers that are skipped
+    previous = {}
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            previous = {item['local_audio_path']: item for item in json.load(f)}
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results = list(ex.map(lambda entry: download_speaker(entry, output_dir, previous, force), speaker_urls))
+
+    updated_speakers = [entry for entry in results if entry]
+
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(updated_speakers, option=orjson.OPT_INDENT_2))
 
     return updated_speakers
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--force", action="store_true", help="Re-crawl every page and re-download existing audio")
+    args = parser.parse_args()
+
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
     OUTPUT_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'raw')
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    get_audio(OUTPUT_DIR)
\ No newline at end of file
+    get_audio(OUTPUT_DIR, force=args.force)
\ No newline at end of file
@@ -1,12 +1,16 @@
 import os
-from pydub import AudioSegment
+import json
+import hashlib
+import subprocess
+import threading
+import numpy as np
 from io import BytesIO
 from pathlib import Path
 import soundfile as sf
 import assemblyai as aai 
 import csv
 from dotenv import load_dotenv
-from tempfile import NamedTemporaryFile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 """
 
@@ -28,24 +32,68 @@ OUTPUT_FAILED_DIR = BASE_DIR / "data/processed/failed"
 
 OUTPUT_TRANSCRIPTS = OUTPUT_DIR / "full_transcripts.csv"
 OUTPUT_FAILED = OUTPUT_DIR / "failed_transcripts.csv"
+
+# AssemblyAI results keyed by a hash of the decoded audio, so reruns skip the API
+TRANSCRIPT_CACHE_DIR = OUTPUT_DIR / "transcript_cache"
+
+SAMPLE_RATE = 16000
+
+# Number of AssemblyAI jobs in flight at once
+MAX_WORKERS = 8
 # ----------------------
 
-# Step 1: Separate audio into speakers and add timestamps to separate narrator from speech
-def transcribe_and_timestamp_audio(file_path, file_name):
-    # Convert original to WAV
-    audio = AudioSegment.from_file(file_path)
+# Worker threads share the failed CSV
+failed_lock = threading.Lock()
 
-    with NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-        audio.export(tmp.name, format='wav')
-        tmp_path = tmp.name
+# Decode any input to 16k mono int16 samples with a single ffmpeg pass
+def decode_audio(file_path):
+    result = subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", str(file_path), "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+    ], check=True, stdout=subprocess.PIPE)
 
-    config = aai.TranscriptionConfig(speaker_labels=True)
-    transcript = aai.Transcriber().transcribe(tmp_path, config)
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+# Transcribe with speaker labels, reusing a cached result when the same audio was seen before
+def transcribe_cached(transcriber, samples):
+    key = hashlib.sha1(samples.tobytes()).hexdigest()
+    cache_path = TRANSCRIPT_CACHE_DIR / f"{key}.json"
+
+    if cache_path.exists():
+        return json.loads(cache_path.read_text(encoding="utf-8"))
+
+    # Upload the WAV straight from memory instead of staging it in a temp file
+    buffer = BytesIO()
+    sf.write(buffer, samples, SAMPLE_RATE, subtype='PCM_16', format='WAV')
+    buffer.seek(0)
+
+    transcript = transcriber.transcribe(buffer)
+    if transcript.status == aai.TranscriptStatus.error:
+        raise RuntimeError(transcript.error)
+
+    utterances = [
+        {"speaker": u.speaker, "start": u.start, "text": u.text}
+        for u in transcript.utterances or []
+    ]
+
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    cache_path.write_text(json.dumps(utterances), encoding="utf-8")
+
+    return utterances
+
+
+# Step 1: Separate audio into speakers and add timestamps to separate narrator from speech
+def transcribe_and_timestamp_audio(transcriber, file_path, file_name):
+    # Decode once; the samples are reused for trimming and failed-clip export
+    samples = decode_audio(file_path)
+
+    utterances = transcribe_cached(transcriber, samples)
 
     # Try to find speaker B
-    for utterance in transcript.utterances:
-        if utterance.speaker == "B":
-            return file_name, utterance.start, utterance.text
+    for utterance in utterances:
+        if utterance["speaker"] == "B":
+            return samples, file_name, utterance["start"], utterance["text"]
 
     # ----- No speaker B found: log + save audio -----
     print(f"[WARN] No speaker B found in {file_name}")
@@ -54,34 +102,34 @@ def transcribe_and_timestamp_audio(file_path, file_name):
     os.makedirs(OUTPUT_FAILED_DIR, exist_ok=True)
 
     # Compute stats about the transcript safely
-    speakers = {u.speaker for u in transcript.utterances} if transcript.utterances else set()
+    speakers = {u["speaker"] for u in utterances}
     num_speakers = len(speakers)
-    full_text = " ".join(u.text for u in transcript.utterances) if transcript.utterances else ""
+    full_text = " ".join(u["text"] for u in utterances)
 
     # Append to failed CSV (create header if file doesn't exist yet)
-    failed_csv_exists = os.path.exists(OUTPUT_FAILED)
-    with open(OUTPUT_FAILED, 'a', newline='') as failed:
-        writer = csv.writer(failed)
-        if not failed_csv_exists:
-            writer.writerow(["Filename", "Total speakers", "Transcript"])
-        writer.writerow([file_name, num_speakers, full_text])
+    with failed_lock:
+        failed_csv_exists = os.path.exists(OUTPUT_FAILED)
+        with open(OUTPUT_FAILED, 'a', newline='') as failed:
+            writer = csv.writer(failed)
+            if not failed_csv_exists:
+                writer.writerow(["Filename", "Total speakers", "Transcript"])
+            writer.writerow([file_name, num_speakers, full_text])
 
     # Save failed audio clip for inspection
     failed_wav_path = OUTPUT_FAILED_DIR / file_name.replace(".mp3", ".wav")
-    audio.export(failed_wav_path, format='wav')
+    sf.write(failed_wav_path, samples, SAMPLE_RATE, subtype='PCM_16')
 
-    return file_name, None, None
+    return samples, file_name, None, None
 
 
 
-# Step 2: Trim narrator speech from audio using Pydub. Save audio as Wav in output folder.
-def trim_audio(start_time, file_name, file_path, output_dir):
+# Step 2: Trim narrator speech by slicing the decoded samples. Save audio as 16k mono Wav in output folder.
+def trim_audio(start_time, file_name, samples, output_dir):
     output_filename = file_name.replace(".mp3", ".wav")
     output_path = os.path.join(output_dir, output_filename)
 
-    audio = AudioSegment.from_file(file_path)
-    trimmed_audio = audio[int(start_time):]
-    trimmed_audio.export(output_path, format='wav')
+    start_sample = int(start_time * SAMPLE_RATE / 1000)
+    sf.write(output_path, samples[start_sample:], SAMPLE_RATE, subtype='PCM_16')
 
     print(f'Trimmed and saved: {output_path}')
 
@@ -102,38 +150,57 @@ def main():
         print("API Key not found in environment variables.")
 
     aai.settings.api_key = api_key
-    transcripts = []
 
     max_files = 1
     processed = 0
 
-    for file_name in os.listdir(AUDIO_DIR):
-        if not file_name.endswith(".wav") or not file_name.endswith(".mp3"):
-            continue
+    with os.scandir(AUDIO_DIR) as it:
+        entries = sorted(
+            (e for e in it if e.is_file() and e.name.endswith((".wav", ".mp3"))),
+            key=lambda e: e.name
+        )
 
-        try:
-            file_path = os.path.join(AUDIO_DIR, file_name)
+    # One transcriber for every job; the remote service runs them in parallel
+    config = aai.TranscriptionConfig(speaker_labels=True)
+    transcriber = aai.Transcriber(config=config)
+
+    # Rows are written as each job finishes so a crash keeps everything done so far
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    transcripts_exists = os.path.exists(OUTPUT_TRANSCRIPTS)
+
+    # The CSV is appended to across runs, so files already in it are not redone
+    if transcripts_exists:
+        with open(OUTPUT_TRANSCRIPTS, newline='') as f:
+            done = {row["Filename"] for row in csv.DictReader(f)}
+        entries = [e for e in entries if e.name not in done]
+    with open(OUTPUT_TRANSCRIPTS, 'a', newline='', buffering=1) as f, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        writer = csv.writer(f)
+        if not transcripts_exists:
+            writer.writerow(["Filename", "Start Time", "Words"])
 
-            result = transcribe_and_timestamp_audio(file_path, file_name)
-            file_name, start_time, transcription = result
+        futures = {
+            ex.submit(transcribe_and_timestamp_audio, transcriber, entry.path, entry.name): entry.path
+            for entry in entries
+        }
 
-            if start_time is None:
-                print(f"[INFO] Skipping trimming for {file_name} because no speaker B was found.")
-                continue
+        for future in as_completed(futures):
+            file_path = futures.pop(future)
 
-            trim_audio(start_time, file_name, file_path, OUTPUT_DIR) 
-            transcripts.append([file_name, start_time, transcription])
+            try:
+                samples, file_name, start_time, transcription = future.result()
 
-            processed += 1
+                if start_time is None:
+                    print(f"[INFO] Skipping trimming for {file_name} because no speaker B was found.")
+                    continue
 
-        except Exception as e:
-            print(f'Failed to transcribe {file_path}: {e}')
-                    
+                trim_audio(start_time, file_name, samples, OUTPUT_DIR) 
+                writer.writerow([file_name, start_time, transcription])
 
-    with open(OUTPUT_TRANSCRIPTS, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(["Filename", "Start Time", "Words"])
-        writer.writerows(transcripts)
+                processed += 1
+
+            except Exception as e:
+                print(f'Failed to transcribe {file_path}: {e}')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
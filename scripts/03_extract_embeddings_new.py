@@ -3,12 +3,17 @@ import os
 import csv
 import json
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import soundfile as sf
 import torch
 import torchaudio
+from torch.utils.data import DataLoader, Dataset
 
 # SpeechBrain (v1+)
 from speechbrain.inference import EncoderClassifier
@@ -27,20 +32,49 @@ CORRUPTED_DIR = BASE_DIR / "data" / "corrupted"
 EMBEDDINGS_INDEX_CSV = EMBEDDINGS_DIR / "embeddings_index.csv"
 EMBEDDING_FAILURES_CSV = FAILED_DIR / "embedding_failures.csv"
 
+# All embeddings live in one [N, D] array; the parquet maps audio stem -> row
+EMBEDDINGS_NPY = EMBEDDINGS_DIR / "embeddings.npy"
+EMBEDDINGS_ROWS_PARQUET = EMBEDDINGS_DIR / "embeddings_rows.parquet"
+
 # Optional: enrich the index with metadata from your scraper output (if present)
 DIALECTS_METADATA_JSON = BASE_DIR / "data" / "raw" / "dialects_metadata.json"
 
 # Model info
 HF_MODEL_ID = "speechbrain/spkrec-ecapa-voxceleb"
 MODEL_CACHE_DIR = BASE_DIR / "pretrained_models" / "ecapa_voxceleb"
+EMBEDDING_DIM = 192
+# torch.compile (PyTorch 2+) or torch.jit.script the ECAPA embedding model.
+# Off by default: no speedup has been measured yet, so runs stay eager unless enabled here.
+COMPILE_MODEL = False
 
 # Audio normalization
 TARGET_SAMPLE_RATE = 16000
 RESAMPLE_IF_NEEDED = False  # You said you already resampled during scraping; set True if you want safety.
 FORCE_MONO = True
 
+# Only the first MAX_SECONDS of each file are decoded; ECAPA needs far less speech than that
+MAX_SECONDS = 30
+
 # Device
-DEFAULT_DEVICE = "cpu"  # On Mac, keep CPU. If on GPU box later, set "cuda".
+DEFAULT_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"  # On Mac this stays CPU.
+
+# Batches are padded to their own longest file, so input shapes rarely repeat and
+# cuDNN autotuning would re-benchmark nearly every batch
+torch.backends.cudnn.benchmark = False
+torch.backends.cudnn.deterministic = False
+
+# Files per ECAPA forward pass
+BATCH_SIZE = 16
+
+# DataLoader worker processes decoding audio ahead of inference
+NUM_WORKERS = 4
+PREFETCH_FACTOR = 4
+
+# CPU-only runs embed batches in worker processes, one single-threaded model each
+CPU_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Index rows buffered in memory before each append to the CSV
+INDEX_FLUSH_ROWS = 256
 
 
 # ----------------------
@@ -52,6 +86,24 @@ def ensure_dirs():
     CORRUPTED_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def find_wav_files(root: Path) -> list:
+    """
+    Recursively lists .wav files with os.scandir, using each DirEntry's cached
+    file type instead of building and stat-ing a Path for every entry.
+    """
+    wav_files = []
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                # Symlinked directories are not followed (as with Path.rglob), so a link loop can't recurse forever
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".wav") and entry.is_file():
+                    wav_files.append(Path(entry.path))
+    return sorted(wav_files)
+
+
 def load_optional_metadata(metadata_path: Path) -> dict:
     """
     Returns a mapping keyed by local audio filename stem if possible.
@@ -78,6 +130,75 @@ def load_optional_metadata(metadata_path: Path) -> dict:
     return by_stem
 
 
+def load_embedding_store():
+    """
+    Opens the embeddings from a previous run read-only.
+    Before the first single-array run, the old per-file {stem}.npy vectors are stacked instead.
+    Returns: (embeddings [N, D] memmap/array or None, {stem: row})
+    """
+    if not (EMBEDDINGS_NPY.exists() and EMBEDDINGS_ROWS_PARQUET.exists()):
+        legacy = sorted(
+            p for p in EMBEDDINGS_DIR.glob("*.npy")
+            if not p.name.startswith(EMBEDDINGS_NPY.stem)
+        )
+        if not legacy:
+            return None, {}
+
+        previous = np.stack([np.load(p).reshape(-1) for p in legacy]).astype(np.float32)
+        return previous, {p.stem: i for i, p in enumerate(legacy)}
+
+    table = pq.read_table(EMBEDDINGS_ROWS_PARQUET)
+    rows = dict(zip(table.column("stem").to_pylist(), table.column("row").to_pylist()))
+    return np.load(EMBEDDINGS_NPY, mmap_mode="r"), rows
+
+
+def open_embedding_store(previous, num_new: int) -> np.memmap:
+    """
+    Creates the [N, D] array for this run: previous rows keep their positions,
+    followed by room for num_new embeddings.
+    """
+    num_previous = previous.shape[0] if previous is not None else 0
+    embeddings = np.lib.format.open_memmap(
+        EMBEDDINGS_DIR / "embeddings.tmp.npy",
+        mode="w+",
+        dtype=np.float32,
+        shape=(num_previous + num_new, EMBEDDING_DIM),
+    )
+    if num_previous:
+        embeddings[:num_previous] = previous
+
+    return embeddings
+
+
+def save_embedding_store(embeddings: np.memmap, rows: dict, num_rows: int):
+    """
+    Flushes the first num_rows of the new embedding array over the old one and writes
+    its stem -> row mapping. Rows reserved for files that failed or were never reached
+    are cut off, so the saved matrix holds no zero vectors.
+    """
+    embeddings.flush()
+    if num_rows < embeddings.shape[0]:
+        compact = np.lib.format.open_memmap(
+            EMBEDDINGS_DIR / "embeddings.compact.tmp.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(num_rows, EMBEDDING_DIM),
+        )
+        for start in range(0, num_rows, INDEX_FLUSH_ROWS):
+            compact[start:start + INDEX_FLUSH_ROWS] = embeddings[start:start + INDEX_FLUSH_ROWS]
+        compact.flush()
+        os.remove(embeddings.filename)
+        embeddings = compact
+
+    os.replace(embeddings.filename, EMBEDDINGS_NPY)
+
+    table = pa.table({
+        "stem": pa.array(list(rows.keys()), type=pa.string()),
+        "row": pa.array(list(rows.values()), type=pa.int64()),
+    })
+    pq.write_table(table, EMBEDDINGS_ROWS_PARQUET)
+
+
 def load_model(device: str = DEFAULT_DEVICE) -> EncoderClassifier:
     """
     Loads ECAPA-TDNN speaker embedding model once.
@@ -88,64 +209,282 @@ def load_model(device: str = DEFAULT_DEVICE) -> EncoderClassifier:
         run_opts={"device": device},
     )
     classifier.eval()
+
+    # Fuse the TDNN graph once up front. torch.compile is lazy, so dummy batches are run
+    # through extract_embeddings (same autocast/inference_mode guards as real batches,
+    # full and single-file sizes) to compile here; any failure restores the eager module.
+    # Default mode only: CUDA graphs (reduce-overhead) would re-record for every padded length.
+    if COMPILE_MODEL:
+        eager_model = classifier.mods.embedding_model
+        try:
+            if hasattr(torch, "compile"):
+                classifier.mods.embedding_model = torch.compile(eager_model, dynamic=True)
+            else:
+                classifier.mods.embedding_model = torch.jit.script(eager_model)
+
+            for batch_size in (BATCH_SIZE, 1):
+                dummy = torch.zeros(batch_size, TARGET_SAMPLE_RATE, device=device)
+                extract_embeddings(classifier, dummy, torch.ones(batch_size))
+        except Exception as e:
+            classifier.mods.embedding_model = eager_model
+            print(f"[WARN] Could not compile embedding model, running eagerly: {e}")
+
     return classifier
 
 
-def load_audio(wav_path: Path, device: str = DEFAULT_DEVICE):
+# Resample kernels keyed by source rate, built once per process
+_RESAMPLERS = {}
+
+
+def get_resampler(orig_freq: int) -> torchaudio.transforms.Resample:
+    """
+    Returns a cached Resample(orig_freq -> TARGET_SAMPLE_RATE) so the sinc filter is built only once.
+    """
+    if orig_freq not in _RESAMPLERS:
+        _RESAMPLERS[orig_freq] = torchaudio.transforms.Resample(orig_freq=orig_freq, new_freq=TARGET_SAMPLE_RATE)
+    return _RESAMPLERS[orig_freq]
+
+
+def load_audio(wav_path: Path):
     """
     Loads audio with torchaudio and standardizes:
       - float32 tensor
       - mono if FORCE_MONO
       - optional resampling to TARGET_SAMPLE_RATE
-    Returns: (waveform, sample_rate)
-      waveform shape typically: [channels, time]  (SpeechBrain accepts this)
+      - at most MAX_SECONDS of audio (the rest is never decoded)
+    Returns: (waveform, sample_rate, duration_sec)
+      waveform is a CPU tensor, typically [channels, time]  (SpeechBrain accepts this);
+      the DataLoader pins it and the main loop moves the batch to the device
+      duration_sec is the full recording's length, not the cropped one
     """
-    waveform, sr = torchaudio.load(str(wav_path))  # waveform: [C, T]
+    # Header probe (soundfile, not the deprecated torchaudio.info) for the native rate,
+    # so the crop is in the file's own frames, and for the full length
+    info = sf.info(str(wav_path))
+    waveform, sr = torchaudio.load(str(wav_path), num_frames=info.samplerate * MAX_SECONDS)  # waveform: [C, T]
+
+    # Some headers don't report a frame count; fall back to what was decoded
+    num_frames = info.frames if info.frames > 0 else waveform.shape[-1]
+    duration_sec = num_frames / sr if sr else 0.0
 
     # Convert to float32
     if waveform.dtype != torch.float32:
         waveform = waveform.to(torch.float32)
 
-    # Force mono
+    # Force mono (dual-mono stereo just keeps channel 0 as a view, skipping the mean)
     if FORCE_MONO and waveform.shape[0] > 1:
-        waveform = waveform.mean(dim=0, keepdim=True)
+        if waveform.shape[0] == 2 and torch.equal(waveform[0], waveform[1]):
+            waveform = waveform[:1]
+        else:
+            waveform = waveform.mean(dim=0, keepdim=True)
 
     # Optional resample safeguard
     if RESAMPLE_IF_NEEDED and sr != TARGET_SAMPLE_RATE:
-        resampler = torchaudio.transforms.Resample(orig_freq=sr, new_freq=TARGET_SAMPLE_RATE)
-        waveform = resampler(waveform)
+        waveform = get_resampler(sr)(waveform)
         sr = TARGET_SAMPLE_RATE
 
-    # Move to device (CPU by default)
-    waveform = waveform.to(device)
+    return waveform, sr, duration_sec
+
+
+def pad_batch(waveforms: list):
+    """
+    Pads [C, T] waveforms into one [B, T_max] batch (downmixing any leftover channels).
+    Returns: (wavs, wav_lens) where wav_lens are lengths relative to T_max,
+      which is what SpeechBrain's encode_batch uses to ignore the padding.
+    """
+    # Mono inputs (the load_audio default) are passed through as views, not re-averaged
+    wavs = [w[0] if w.shape[0] == 1 else w.mean(dim=0) for w in waveforms]
+    lengths = torch.tensor([w.shape[0] for w in wavs], dtype=torch.float32)
+    batch = torch.nn.utils.rnn.pad_sequence(wavs, batch_first=True)
+    return batch, lengths / lengths.max()
+
+
+class WavDataset(Dataset):
+    """
+    Decodes WAVs inside DataLoader workers so disk + decode time overlaps inference.
+    Items: (waveform [C, T], sample_rate, duration_sec, wav_path, error); a failed load has waveform None.
+    """
+
+    def __init__(self, wav_paths: list):
+        self.wav_paths = wav_paths
+
+    def __len__(self):
+        return len(self.wav_paths)
 
-    return waveform, sr
+    def __getitem__(self, idx):
+        wav_path = self.wav_paths[idx]
+        try:
+            waveform, sr, duration_sec = load_audio(wav_path)
+            return waveform, sr, duration_sec, wav_path, None
+        except Exception as e:
+            return None, 0, 0.0, wav_path, str(e)
 
 
-def extract_embedding(model: EncoderClassifier, waveform: torch.Tensor) -> np.ndarray:
+def collate_batch(items: list):
     """
-    Runs ECAPA inference and returns a 1D NumPy embedding vector.
-    Typical model output: [B, N, D] -> squeeze -> [D]
+    Splits a batch into loaded and failed files and pads the loaded ones.
+    Returns: (wavs, wav_lens, loaded, failed)
+      loaded: [(wav_path, duration_sec, sample_rate)], failed: [(wav_path, reason)]
     """
-    with torch.no_grad():
-        emb = model.encode_batch(waveform)  # often [1, 1, 192] for single waveform
+    loaded = [(wav_path, duration_sec, sr) for _, sr, duration_sec, wav_path, error in items if error is None]
+    failed = [(wav_path, error) for _, _, _, wav_path, error in items if error is not None]
+
+    waveforms = [waveform for waveform, _, _, _, error in items if error is None]
+    if not waveforms:
+        return None, None, loaded, failed
+
+    wavs, wav_lens = pad_batch(waveforms)
+    return wavs, wav_lens, loaded, failed
+
+
+# Pinned [BATCH_SIZE, EMBEDDING_DIM] host buffer for GPU -> CPU embedding copies, allocated once
+_HOST_BUF = None
+
 
-    emb = emb.squeeze().detach().cpu().numpy()  # -> (192,)
-    # Ensure 1D
-    emb = np.asarray(emb).reshape(-1)
-    return emb
+def get_host_buffer() -> torch.Tensor:
+    global _HOST_BUF
+    if _HOST_BUF is None:
+        _HOST_BUF = torch.empty((BATCH_SIZE, EMBEDDING_DIM), dtype=torch.float32, pin_memory=True)
+    return _HOST_BUF
 
 
-def append_csv_row(csv_path: Path, header: list, row: list):
+def extract_embeddings(model: EncoderClassifier, wavs: torch.Tensor, wav_lens: torch.Tensor) -> np.ndarray:
     """
-    Appends a single row. Creates file + header if missing.
+    Runs ECAPA inference on a padded batch and returns a [B, D] NumPy array.
+    Typical model output: [B, 1, D] -> reshape -> [B, D]
+    On CUDA the forward pass runs under fp16 autocast; output is returned as float32.
+    On CUDA the array is a view of a reused pinned buffer: copy it out before the next call.
     """
+    use_amp = str(model.device).startswith("cuda")
+
+    with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=use_amp):
+        emb = model.encode_batch(wavs, wav_lens)  # [B, 1, 192]
+        emb = emb.reshape(emb.shape[0], -1).float()
+
+        if not use_amp:
+            return emb.numpy()
+
+        # One async D2H copy for the whole batch, one sync before NumPy reads it
+        host = get_host_buffer()[: emb.shape[0]]
+        host.copy_(emb, non_blocking=True)
+        torch.cuda.current_stream(emb.device).synchronize()
+
+    return host.numpy()
+
+
+# Model loaded by init_worker in each CPU worker process
+_worker_model = None
+
+
+def init_worker():
+    """
+    ProcessPoolExecutor initializer: loads the model once per worker and pins it
+    to one intra-op thread so the workers don't oversubscribe the cores.
+    """
+    global _worker_model
+    torch.set_num_threads(1)
+    _worker_model = load_model(device="cpu")
+
+
+def embed_paths(wav_paths: list):
+    """
+    Worker task: loads, pads and embeds one batch of files on CPU.
+    Returns: (loaded, failed, embs) in the same shape as iter_embedded_batches.
+    """
+    dataset = WavDataset(wav_paths)
+    wavs, wav_lens, loaded, failed = collate_batch([dataset[i] for i in range(len(dataset))])
+    if not loaded:
+        return loaded, failed, None
+
+    try:
+        embs = extract_embeddings(_worker_model, wavs, wav_lens)
+    except Exception as e:
+        return [], failed + [(wav_path, str(e)) for wav_path, _, _ in loaded], None
+
+    return loaded, failed, embs
+
+
+def iter_embedded_batches(model, pending: list, device: str):
+    """
+    Yields (loaded, failed, embs) per batch of BATCH_SIZE files.
+    CPU: batches are spread over CPU_WORKERS processes, each with its own model (`model` is unused).
+    CUDA: a DataLoader decodes ahead while the single model runs on the GPU.
+    """
+    if device == "cpu":
+        batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        with ProcessPoolExecutor(max_workers=CPU_WORKERS, initializer=init_worker) as ex:
+            yield from ex.map(embed_paths, batches)
+        return
+
+    # Workers share decoded tensors through the filesystem to avoid running out of fds
+    torch.multiprocessing.set_sharing_strategy("file_system")
+
+    loader = DataLoader(
+        WavDataset(pending),
+        batch_size=BATCH_SIZE,
+        num_workers=NUM_WORKERS,
+        collate_fn=collate_batch,
+        pin_memory=True,
+        prefetch_factor=PREFETCH_FACTOR if NUM_WORKERS else None,
+    )
+
+    for wavs, wav_lens, loaded, failed in loader:
+        if not loaded:
+            yield loaded, failed, None
+            continue
+
+        try:
+            wavs = wavs.to(device, non_blocking=True)
+            embs = extract_embeddings(model, wavs, wav_lens)
+        except Exception as e:
+            yield [], failed + [(wav_path, str(e)) for wav_path, _, _ in loaded], None
+            continue
+
+        yield loaded, failed, embs
+
+
+def append_csv_rows(csv_path: Path, header: list, rows: list):
+    """
+    Appends rows with a single open. Creates file + header if missing.
+    """
+    if not rows:
+        return
+
     exists = csv_path.exists()
     with open(csv_path, "a", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         if not exists:
             writer.writerow(header)
-        writer.writerow(row)
+        writer.writerows(rows)
+
+
+def migrate_index_csv(csv_path: Path, header: list, rows: dict):
+    """
+    Rewrites an existing index whose header differs from `header` (columns are matched
+    by name, new ones left blank) so later appends stay aligned with it.
+    Kept rows point at their row in EMBEDDINGS_NPY; rows whose stem has no embedding
+    there are dropped, since that file gets re-embedded and indexed again.
+    """
+    if not csv_path.exists():
+        return
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames == header:
+            return
+        old_rows = list(reader)
+
+    tmp_path = csv_path.with_suffix(".tmp.csv")
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header, restval="", extrasaction="ignore")
+        writer.writeheader()
+        for old_row in old_rows:
+            row = rows.get(old_row.get("audio_stem"))
+            if row is None:
+                continue
+            old_row["embedding_path"] = str(EMBEDDINGS_NPY)
+            old_row["embedding_row"] = row
+            writer.writerow(old_row)
+    os.replace(tmp_path, csv_path)
 
 
 def safe_move_to_corrupted(src_path: Path, reason: str):
@@ -157,6 +496,28 @@ def safe_move_to_corrupted(src_path: Path, reason: str):
         return "", f"{reason} | move_failed: {e}"
 
 
+def record_failure(wav_path: Path, e, failures_header: list, created_utc: str):
+    """
+    Logs a failed file to the failures CSV, moving it to CORRUPTED_DIR if it looks undecodable.
+    """
+    # If it looks like an audio decode/load issue, move to corrupted
+    reason = str(e)
+    moved_path = ""
+    if "Error opening input" in reason or "Decoding failed" in reason or "ffmpeg" in reason:
+        moved_path, reason = safe_move_to_corrupted(wav_path, reason)
+
+    append_csv_rows(
+        EMBEDDING_FAILURES_CSV,
+        failures_header,
+        [[str(wav_path), wav_path.name, reason, created_utc]],
+    )
+
+    if moved_path:
+        print(f"[ERROR] Corrupted audio moved: {wav_path.name} -> {moved_path}")
+    else:
+        print(f"[ERROR] Failed: {wav_path.name} | {reason}")
+
+
 # ----------------------
 # Main
 # ----------------------
@@ -167,10 +528,12 @@ def main():
     meta_by_stem = load_optional_metadata(DIALECTS_METADATA_JSON)
 
     device = DEFAULT_DEVICE
+    # On CPU the workers embed with their own copies, but loading here first downloads
+    # MODEL_CACHE_DIR once instead of letting every worker race to populate it
     model = load_model(device=device)
 
     # Find WAV files (recursive)
-    wav_files = sorted(PROCESSED_AUDIO_DIR.rglob("*.wav"))
+    wav_files = find_wav_files(PROCESSED_AUDIO_DIR) if PROCESSED_AUDIO_DIR.exists() else []
     if not wav_files:
         print(f"[WARN] No .wav files found under: {PROCESSED_AUDIO_DIR}")
         return
@@ -180,6 +543,7 @@ def main():
         "audio_filename",
         "audio_stem",
         "embedding_path",
+        "embedding_row",
         "embedding_dim",
         "sample_rate",
         "duration_sec",
@@ -201,85 +565,86 @@ def main():
 
     created_utc = datetime.utcnow().isoformat(timespec="seconds") + "Z"
     processed_count = 0
-    skipped_count = 0
     failed_count = 0
 
-    for wav_path in wav_files:
-        stem = wav_path.stem
-        embedding_path = EMBEDDINGS_DIR / f"{stem}.npy"
+    # Skip if already embedded
+    previous, rows = load_embedding_store()
+    pending = [wav_path for wav_path in wav_files if wav_path.stem not in rows]
+    skipped_count = len(wav_files) - len(pending)
 
-        # Skip if already embedded
-        if embedding_path.exists():
-            skipped_count += 1
-            continue
+    # Earlier rows come first; new embeddings take the next free row only once they exist
+    embeddings = open_embedding_store(previous, len(pending))
+    next_row = embeddings.shape[0] - len(pending)
+    del previous
 
-        try:
-            waveform, sr = load_audio(wav_path, device=device)
-
-            # Duration estimate
-            # waveform: [C, T]
-            num_samples = waveform.shape[-1]
-            duration_sec = float(num_samples) / float(sr) if sr else 0.0
-
-            emb = extract_embedding(model, waveform)
-            np.save(str(embedding_path), emb)
-
-            # Optional metadata enrichment
-            meta = meta_by_stem.get(stem, {})
-            continent = meta.get("continent", "")
-            country = meta.get("country", "")
-            speaker = meta.get("speaker", "")
-            audio_url = meta.get("audio_url", "")
-
-            append_csv_row(
-                EMBEDDINGS_INDEX_CSV,
-                index_header,
-                [
-                    str(wav_path),
-                    wav_path.name,
-                    stem,
-                    str(embedding_path),
-                    int(emb.shape[0]),
-                    int(sr),
-                    f"{duration_sec:.3f}",
-                    device,
-                    created_utc,
-                    continent,
-                    country,
-                    speaker,
-                    audio_url,
-                ],
-            )
-
-            processed_count += 1
-            if processed_count % 25 == 0:
-                print(f"[INFO] Embedded {processed_count} files...")
+    migrate_index_csv(EMBEDDINGS_INDEX_CSV, index_header, rows)
 
-        except Exception as e:
-            failed_count += 1
-
-            # If it looks like an audio decode/load issue, move to corrupted
-            reason = str(e)
-            moved_path = ""
-            if "Error opening input" in reason or "Decoding failed" in reason or "ffmpeg" in reason:
-                moved_path, reason = safe_move_to_corrupted(wav_path, reason)
-
-            append_csv_row(
-                EMBEDDING_FAILURES_CSV,
-                failures_header,
-                [str(wav_path), wav_path.name, reason, created_utc],
-            )
-
-            if moved_path:
-                print(f"[ERROR] Corrupted audio moved: {wav_path.name} -> {moved_path}")
-            else:
-                print(f"[ERROR] Failed: {wav_path.name} | {reason}")
+    # Buffered index rows are flushed even if the run is interrupted
+    index_rows = []
+    try:
+        for loaded, failed, embs in iter_embedded_batches(model, pending, device):
+            # A bad file only drops itself from the batch
+            for wav_path, reason in failed:
+                failed_count += 1
+                record_failure(wav_path, reason, failures_header, created_utc)
+
+            if not loaded:
+                continue
+
+            for (wav_path, duration_sec, sr), emb in zip(loaded, embs):
+                stem = wav_path.stem
+
+                try:
+                    row = next_row
+                    embeddings[row] = emb
+                    rows[stem] = row
+                    next_row += 1
+
+                    # Optional metadata enrichment
+                    meta = meta_by_stem.get(stem, {})
+                    continent = meta.get("continent", "")
+                    country = meta.get("country", "")
+                    speaker = meta.get("speaker", "")
+                    audio_url = meta.get("audio_url", "")
+
+                    index_rows.append([
+                        str(wav_path),
+                        wav_path.name,
+                        stem,
+                        str(EMBEDDINGS_NPY),
+                        row,
+                        int(emb.shape[0]),
+                        int(sr),
+                        f"{duration_sec:.3f}",
+                        device,
+                        created_utc,
+                        continent,
+                        country,
+                        speaker,
+                        audio_url,
+                    ])
+
+                    processed_count += 1
+                    if processed_count % 25 == 0:
+                        print(f"[INFO] Embedded {processed_count} files...")
+
+                    if len(index_rows) >= INDEX_FLUSH_ROWS:
+                        append_csv_rows(EMBEDDINGS_INDEX_CSV, index_header, index_rows)
+                        index_rows = []
+
+                except Exception as e:
+                    failed_count += 1
+                    record_failure(wav_path, e, failures_header, created_utc)
+    finally:
+        append_csv_rows(EMBEDDINGS_INDEX_CSV, index_header, index_rows)
+        save_embedding_store(embeddings, rows, next_row)
 
     print("\nDone.")
     print(f"  Embedded: {processed_count}")
     print(f"  Skipped (already exists): {skipped_count}")
     print(f"  Failed: {failed_count}")
-    print(f"\nIndex: {EMBEDDINGS_INDEX_CSV}")
+    print(f"\nEmbeddings: {EMBEDDINGS_NPY}")
+    print(f"Index: {EMBEDDINGS_INDEX_CSV}")
     print(f"Failures: {EMBEDDING_FAILURES_CSV}")
 
 
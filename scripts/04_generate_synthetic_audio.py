@@ -1,14 +1,15 @@
 import os
 import sys
 import csv
+import hashlib
 import torch
+import soundfile as sf
 from pydub import AudioSegment
 from pathlib import Path
 
 # Add parent directory (one level up from scripts/)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from openvoice import se_extractor
 from openvoice.api import BaseSpeakerTTS, ToneColorConverter
 
 # Now you can import modules from the local openvoice repo
@@ -24,6 +25,7 @@ OUTPUT_CSV = SYNTHETIC_DIR / "metadata.csv"
 CHECKPOINT_BASE = BASE_DIR / "checkpoints/base_speakers/EN"
 CHECKPOINT_CONVERTER = BASE_DIR / "checkpoints/converter"
 REFERENCE_CLIP_MS = 3000
+SE_METHOD = "extract_se"  # Part of the tone color cache key; change it when the SE computation changes
 ENCODE_MESSAGE = "@MyShell"
 # --------------------------
 
@@ -34,19 +36,56 @@ def init_models(device):
     tone_converter = ToneColorConverter(f"{CHECKPOINT_CONVERTER}/config.json", device=device)
     tone_converter.load_ckpt(f"{CHECKPOINT_CONVERTER}/checkpoint.pth")
 
-    source_se = torch.load(f"{CHECKPOINT_BASE}/en_default_se.pth").to(device)
+    # Deserialize straight onto the target device instead of loading then copying
+    source_se = torch.load(f"{CHECKPOINT_BASE}/en_default_se.pth", map_location=device)
     return base_tts, tone_converter, source_se
 
 def extract_reference_clip(audio_path, output_path, duration_ms=REFERENCE_CLIP_MS):
-    audio = AudioSegment.from_wav(audio_path)
-    ref_clip = audio[:duration_ms]
-    ref_clip.export(output_path, format="wav")
+    if Path(audio_path).suffix.lower() != ".wav":
+        audio = AudioSegment.from_file(audio_path)
+        audio[:duration_ms].export(output_path, format="wav")
+        return
+
+    # Read only the clip's frames from the WAV instead of decoding the whole file
+    with sf.SoundFile(str(audio_path)) as src:
+        frames = int(src.samplerate * duration_ms / 1000)
+        data = src.read(frames, dtype="float32")
+        sf.write(str(output_path), data, src.samplerate, subtype=src.subtype)
+
+def cache_tag(source_path, *parts):
+    """
+    Short key for files derived from a source recording. It changes when the source is
+    rewritten (size/mtime), when REFERENCE_CLIP_MS changes, or with any extra parts.
+    """
+    st = os.stat(source_path)
+    key = ":".join(str(p) for p in (st.st_size, st.st_mtime_ns, REFERENCE_CLIP_MS, *parts))
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+def get_target_se(uid, ref_clip_path, se_path, tone_converter, device, se_cache):
+    """
+    Tone color embedding for one source recording. Rows that share a source reuse it:
+    kept in se_cache for this run and saved at se_path (keyed by cache_tag) for later runs.
+    """
+    if uid in se_cache:
+        return se_cache[uid]
+
+    if se_path.exists():
+        target_se = torch.load(se_path, map_location=device)
+    else:
+        # The clip is already a curated REFERENCE_CLIP_MS head, so embed it directly
+        # instead of letting get_se re-segment it with VAD (or Whisper when vad=False)
+        target_se = tone_converter.extract_se([str(ref_clip_path)])
+        torch.save(target_se, se_path)
+
+    se_cache[uid] = target_se
+    return target_se
 
 def main():
     device = "cuda" if torch.cuda.is_available() else "cpu"
     os.makedirs(OUTPUT_WAV_DIR, exist_ok=True)
 
     base_tts, tone_converter, source_se = init_models(device)
+    se_cache = {}
 
     with open(METADATA_IN, newline='') as f_in, open(OUTPUT_CSV, "w", newline='') as f_out:
         reader = csv.DictReader(f_in)
@@ -59,21 +98,18 @@ def main():
                 text = row["text"]
                 uid = full_path.stem
 
-                # File paths
-                ref_clip_path = OUTPUT_WAV_DIR / f"{uid}_ref.wav"
+                # File paths; cached clip/SE names carry a tag so stale ones are never reused
+                ref_clip_path = OUTPUT_WAV_DIR / f"{uid}_{cache_tag(full_path)}_ref.wav"
+                se_path = OUTPUT_WAV_DIR / f"{uid}_{cache_tag(full_path, SE_METHOD)}_se.pt"
                 tts_output_path = OUTPUT_WAV_DIR / f"{uid}_tmp.wav"
                 final_output_path = OUTPUT_WAV_DIR / f"{uid}_synth.wav"
 
-                # Extract speaker reference clip
-                extract_reference_clip(full_path, ref_clip_path)
+                # Extract speaker reference clip (once per source recording)
+                if not ref_clip_path.exists():
+                    extract_reference_clip(full_path, ref_clip_path)
 
                 # Get target tone color embedding
-                target_se, _ = se_extractor.get_se(
-                    reference_audio_path=str(ref_clip_path),
-                    tone_color_converter=tone_converter,
-                    target_dir=str(OUTPUT_WAV_DIR),
-                    vad=True
-                )
+                target_se = get_target_se(uid, ref_clip_path, se_path, tone_converter, device, se_cache)
 
                 # Step 1: Base speaker TTS
                 base_tts.tts(
@@ -1,11 +1,19 @@
 import os
 import sys
+import math
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import torch
 import torchaudio
 from pydub import AudioSegment
-from io import BytesIO
-import soundfile as sf
+import numpy as np
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+# GPU runs batch VAD across files instead of one process per file
+VAD_BATCH_SIZE = 16
+VAD_WINDOW = 512  # samples per Silero frame at 16 kHz
 
 # Load Silero VAD
 def load_silero_vad():
@@ -15,44 +23,106 @@ def load_silero_vad():
         trust_repo=True
     )
     get_speech_timestamps, _, _, read_audio, _ = utils
+
+    if DEVICE == "cpu":
+        # Files already run in parallel processes; one thread each avoids oversubscription
+        torch.set_num_threads(1)
+
+    model = model.to(DEVICE).eval()
     return model, get_speech_timestamps
 
-model, get_speech_timestamps = load_silero_vad()
+# Loaded once per process: by preprocess in the parent, by the pool initializer in workers
+_vad = None
 
-def audiosegment_to_waveform(segment, target_sr=16000):
-    buffer = BytesIO()
-    segment.export(buffer, format='wav')
-    buffer.seek(0)
+def get_vad():
+    global _vad
+    if _vad is None:
+        _vad = load_silero_vad()
+    return _vad
 
-    waveform, sr = sf.read(buffer, dtype='float32')  # returns numpy array
+def audiosegment_to_waveform(segment, target_sr=16000):
+    # Read the PCM samples pydub already holds instead of round-tripping through a WAV buffer
+    samples = segment.get_array_of_samples()
+    scale = float(1 << (8 * segment.sample_width - 1))
+    waveform = np.frombuffer(samples, dtype=samples.typecode).astype(np.float32) / scale
     waveform = torch.from_numpy(waveform)
+    sr = segment.frame_rate
+
+    if segment.channels > 1:
+        waveform = waveform.view(-1, segment.channels).mean(dim=1)  # downmix to mono if stereo
 
     if sr != target_sr:
         waveform = torchaudio.functional.resample(waveform, sr, target_sr)
         sr = target_sr
 
-    if waveform.ndim > 1:
-        waveform = waveform.mean(dim=1)  # downmix to mono if stereo
-
     return waveform, sr
 
 
 
-def detect_speech_start(audio_segment, initial_skip_ms=13000, max_skip_ms=20000, step_ms=2000):
+class _ReplayVAD:
+    """
+    Stands in for the Silero model inside get_speech_timestamps, replaying frame
+    probabilities already computed in a batch so the segmenting rules stay Silero's own.
+    """
+    def __init__(self, probs):
+        self.probs = probs
+        self.i = 0
+
+    def reset_states(self):
+        self.i = 0
+
+    def __call__(self, chunk, sr):
+        prob = self.probs[self.i]
+        self.i += 1
+        return torch.tensor(prob)
+
+
+def batch_speech_timestamps(waveforms, sr):
+    """
+    Run Silero VAD on several clips at once as one zero-padded [B, T] batch,
+    then map the frame probabilities back to each clip using its real length.
+    """
+    model, get_speech_timestamps = get_vad()
+    lengths = [w.shape[0] for w in waveforms]
+    batch = torch.nn.utils.rnn.pad_sequence(waveforms, batch_first=True).to(DEVICE)
+
+    with torch.inference_mode():
+        probs = model.audio_forward(batch, sr).cpu()
+
+    return [
+        get_speech_timestamps(waveform, _ReplayVAD(clip_probs[:math.ceil(n / VAD_WINDOW)].tolist()), sampling_rate=sr)
+        for waveform, clip_probs, n in zip(waveforms, probs, lengths)
+    ]
+
+
+def detect_speech_start(waveform, sr, **kwargs):
+    """
+    VAD runs once over the whole clip; the skip scan only filters the returned segments.
+    """
+    model, get_speech_timestamps = get_vad()
+    waveform = waveform.to(DEVICE)
+
+    with torch.inference_mode():
+        segments = get_speech_timestamps(waveform, model, sampling_rate=sr)
+
+    return find_speech_start(segments, sr, **kwargs)
+
+
+def find_speech_start(segments, sr, initial_skip_ms=13000, max_skip_ms=20000, step_ms=2000):
     """
     Skip the first `initial_skip_ms` milliseconds (narration),
-    then incrementally scan for real speech using Silero VAD.
+    then incrementally scan the VAD segments for real speech.
     """
     skip_ms = initial_skip_ms
 
     while skip_ms <= max_skip_ms:
-        post_narration = audio_segment[skip_ms:]
-        waveform, sr = audiosegment_to_waveform(post_narration)
+        skip_samples = int(skip_ms * sr / 1000)
 
-        segments = get_speech_timestamps(waveform, model, sampling_rate=sr)
-        if segments:
+        # First segment still running after the skip point, clipped to it
+        first = next((seg for seg in segments if seg['end'] > skip_samples), None)
+        if first:
             # Convert first segment start time to ms
-            relative_start_ms = segments[0]['start'] / sr * 1000
+            relative_start_ms = max(first['start'] - skip_samples, 0) / sr * 1000
             absolute_start_ms = skip_ms + relative_start_ms
 
             # If the VAD detects something at least 1 second after skip, accept it
@@ -68,34 +138,84 @@ def detect_speech_start(audio_segment, initial_skip_ms=13000, max_skip_ms=20000,
 
 
 
+def move_to_corrupted(file_path, corrupted_dir):
+    input_dir, file = os.path.split(file_path)
+    shutil.move(file_path, os.path.join(corrupted_dir, file))
+
+    txt_file = file.replace(".mp3", ".txt")
+    txt_path = os.path.join(input_dir, txt_file)
+    if os.path.exists(txt_path):
+        shutil.move(txt_path, os.path.join(corrupted_dir, txt_file))
+
+
+def export_trimmed(audio, start_ms, file_path, output_dir):
+    output_filename = os.path.basename(file_path).replace(".mp3", ".wav")
+    trimmed_audio = audio[int(start_ms):]
+    trimmed_audio.export(os.path.join(output_dir, output_filename), format="wav")
+    print(f"Trimmed and saved: {output_filename}")
+
+
+def process_one(file_path, output_dir, corrupted_dir):
+    try:
+        audio = AudioSegment.from_file(file_path)
+        waveform, sr = audiosegment_to_waveform(audio)
+        start_ms = detect_speech_start(waveform, sr)
+        export_trimmed(audio, start_ms, file_path, output_dir)
+
+    except Exception as e:
+        print(f"Failed to process {os.path.basename(file_path)}: {e}")
+        move_to_corrupted(file_path, corrupted_dir)
+
+
+def process_batch(file_paths, output_dir, corrupted_dir):
+    decoded = []
+    for file_path in file_paths:
+        try:
+            audio = AudioSegment.from_file(file_path)
+            waveform, sr = audiosegment_to_waveform(audio)
+            decoded.append((file_path, audio, waveform, sr))
+
+        except Exception as e:
+            print(f"Failed to process {os.path.basename(file_path)}: {e}")
+            move_to_corrupted(file_path, corrupted_dir)
+
+    if not decoded:
+        return
+
+    # Every waveform is resampled to the same rate by audiosegment_to_waveform
+    sr = decoded[0][3]
+    all_segments = batch_speech_timestamps([waveform for _, _, waveform, _ in decoded], sr)
+
+    for (file_path, audio, _, _), segments in zip(decoded, all_segments):
+        try:
+            start_ms = find_speech_start(segments, sr)
+            export_trimmed(audio, start_ms, file_path, output_dir)
+
+        except Exception as e:
+            print(f"Failed to process {os.path.basename(file_path)}: {e}")
+            move_to_corrupted(file_path, corrupted_dir)
+
+
 def preprocess(input_dir, output_dir, corrupted_dir):
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(corrupted_dir, exist_ok=True)
 
-    for _, _, files in os.walk(input_dir):
-        for file in files:
-            if not file.endswith(".mp3"):
-                continue
-
-            file_path = os.path.join(input_dir, file)
-            output_filename = file.replace(".mp3", ".wav")
-            output_path = os.path.join(output_dir, output_filename)
-
-            try:
-                audio = AudioSegment.from_file(file_path)
-                start_ms = detect_speech_start(audio)
-                trimmed_audio = audio[int(start_ms):]
-                trimmed_audio.export(output_path, format="wav")
-                print(f"Trimmed and saved: {output_filename}")
-
-            except Exception as e:
-                print(f"Failed to process {file}: {e}")
-                shutil.move(file_path, os.path.join(corrupted_dir, file))
-
-                txt_file = file.replace(".mp3", ".txt")
-                txt_path = os.path.join(input_dir, txt_file)
-                if os.path.exists(txt_path):
-                    shutil.move(txt_path, os.path.join(corrupted_dir, txt_file))
+    with os.scandir(input_dir) as it:
+        file_paths = sorted(e.path for e in it if e.is_file() and e.name.endswith(".mp3"))
+
+    # Load (and on a cold cache, download) the model before any file is touched, so a
+    # hub or network failure stops the run instead of sending good files to corrupted/
+    get_vad()
+
+    if DEVICE == "cuda":
+        # One model on the GPU; batching amortizes kernel launches across files
+        for i in range(0, len(file_paths), VAD_BATCH_SIZE):
+            process_batch(file_paths[i:i + VAD_BATCH_SIZE], output_dir, corrupted_dir)
+        return
+
+    # Workers load from the now-warm hub cache; a failed load breaks the pool, not a file
+    with ProcessPoolExecutor(max_workers=min(8, os.cpu_count()), initializer=get_vad) as ex:
+        list(ex.map(process_one, file_paths, repeat(output_dir), repeat(corrupted_dir)))
 
 def main():
     if len(sys.argv) < 3: